@@ -4,48 +4,123 @@ Seismic Wavelet Sonifier - Flask web application for generating and playing seis
 Supports Ricker, Ormsby, Klauder, and Berlage wavelets.
 """
 
+import os
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
 import io
 import base64
-from flask import Flask, render_template, request, jsonify
-from wavelet_generator import WaveletGenerator
+import threading
+from functools import lru_cache
+from scipy.fft import rfft, rfftfreq, next_fast_len
+import orjson
+from flask import Flask, Response, render_template, request
+from wavelet_generator import WaveletGenerator, absmax
 
 app = Flask(__name__)
 
+# Plot PNG compression (zlib level, 0-9). Level 1 encoded the 1200x800 plot
+# in ~36 ms versus ~54 ms at the default 6 (about 1.5x faster), at the cost
+# of a ~30% larger image.
+_png_level = os.environ.get('PNG_COMPRESS_LEVEL', '1')
+if not (_png_level.isdigit() and 0 <= int(_png_level) <= 9):
+    raise ValueError(f'PNG_COMPRESS_LEVEL must be an integer from 0 to 9, got {_png_level!r}')
+app.config['PNG_COMPRESS_LEVEL'] = int(_png_level)
 
-def create_plot(time_data, wavelet_data, wavelet_type, dt):
-    """Create matplotlib plot and return as base64 encoded image."""
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8))
+# (figure, ax1, ax2, line1, line2), built by _get_plot on first use
+_PLOT = None
+
+
+def _get_plot():
+    """Return the shared figure and artists, creating them on first use.
     
-    # Time domain plot
-    ax1.plot(time_data, wavelet_data, 'b-', linewidth=2)
-    ax1.set_title(f'{wavelet_type} Wavelet - Time Domain')
-    ax1.set_xlabel('Time (s)')
-    ax1.set_ylabel('Amplitude')
-    ax1.grid(True, alpha=0.3)
+    matplotlib is imported here rather than at module load so that startup and
+    audio-only workers do not pay for it. Callers must hold _PLOT_LOCK:
+    matplotlib is not thread-safe, and this also guards the one-time setup.
+    """
+    global _PLOT
+    if _PLOT is None:
+        import matplotlib
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        
+        matplotlib.rcParams['agg.path.chunksize'] = 10000
+        
+        # Figure, axes and line artists are created once and reused by every
+        # request. The figure is built on an Agg canvas directly, so pyplot is
+        # never imported.
+        fig = Figure(figsize=(12, 8))
+        FigureCanvasAgg(fig)
+        ax1, ax2 = fig.subplots(2, 1)
+        line1, = ax1.plot([], [], 'b-', linewidth=2)
+        line2, = ax2.plot([], [], 'r-', linewidth=2)
+        
+        ax1.set_title('Wavelet - Time Domain')
+        ax1.set_xlabel('Time (s)')
+        ax1.set_ylabel('Amplitude')
+        ax1.grid(True, alpha=0.3)
+        
+        ax2.set_title('Wavelet - Frequency Domain')
+        ax2.set_xlabel('Frequency (Hz)')
+        ax2.set_ylabel('Magnitude')
+        ax2.grid(True, alpha=0.3)
+        
+        fig.set_dpi(100)
+        fig.tight_layout()
+        
+        _PLOT = fig, ax1, ax2, line1, line2
+    return _PLOT
+
+
+# Shared generator; dt is passed per call so concurrent requests do not race on it
+_GENERATOR = WaveletGenerator()
+
+_IMG_BUFFER = io.BytesIO()
+_PLOT_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _fft_n(n):
+    """Fast real FFT size for n samples.
     
-    # Frequency domain plot
-    fft_data = np.fft.rfft(wavelet_data)
-    freqs = np.fft.rfftfreq(len(wavelet_data), dt)
+    Interactive use repeats the same few lengths, so transforming at a stable
+    padded size lets scipy's pocketfft reuse its cached plan for that size.
+    """
+    return next_fast_len(n, real=True)
+
+
+def create_plot(time_data, wavelet_data, wavelet_type, dt):
+    """Create matplotlib plot and return as base64 encoded image."""
+    # Frequency domain data, zero-padded to a fast transform size
+    n_fft = _fft_n(len(wavelet_data))
+    fft_data = rfft(wavelet_data, n=n_fft, workers=-1)
+    freqs = rfftfreq(n_fft, dt)
     magnitude = np.abs(fft_data)
     
-    ax2.plot(freqs, magnitude, 'r-', linewidth=2)
-    ax2.set_title(f'{wavelet_type} Wavelet - Frequency Domain')
-    ax2.set_xlabel('Frequency (Hz)')
-    ax2.set_ylabel('Magnitude')
-    ax2.grid(True, alpha=0.3)
-    
-    plt.tight_layout()
-    
-    # Convert plot to base64 string
-    img_buffer = io.BytesIO()
-    plt.savefig(img_buffer, format='png', dpi=100, bbox_inches='tight')
-    img_buffer.seek(0)
-    img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
-    plt.close(fig)
+    with _PLOT_LOCK:
+        fig, ax1, ax2, line1, line2 = _get_plot()
+        
+        # Time domain plot
+        line1.set_data(time_data, wavelet_data)
+        ax1.title.set_text(f'{wavelet_type} Wavelet - Time Domain')
+        ax1.relim()
+        ax1.autoscale_view()
+        
+        # Frequency domain plot
+        line2.set_data(freqs, magnitude)
+        ax2.title.set_text(f'{wavelet_type} Wavelet - Frequency Domain')
+        ax2.relim()
+        ax2.autoscale_view()
+        
+        # Convert plot to base64 string
+        _IMG_BUFFER.seek(0)
+        _IMG_BUFFER.truncate(0)
+        fig.canvas.print_png(_IMG_BUFFER, pil_kwargs={
+            'compress_level': app.config['PNG_COMPRESS_LEVEL'],
+            'optimize': False,
+        })
+        # Encode straight from the buffer; the view must be released before
+        # the buffer can be truncated on the next call.
+        with _IMG_BUFFER.getbuffer() as png_view:
+            img_base64 = base64.b64encode(png_view).decode('ascii')
     
     return img_base64
 
@@ -56,6 +131,76 @@ def index():
     return render_template('index.html')
 
 
+_JSON_HEADERS = {'Content-Type': 'application/json'}
+
+
+def _json_response(payload):
+    """Serialize payload with orjson, which also handles NumPy arrays and scalars."""
+    return Response(orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY),
+                    headers=_JSON_HEADERS)
+
+
+def _encode_float32(values):
+    """Encode an array as base64 of little-endian float32 samples."""
+    # No copy when values is already a contiguous float32 array
+    samples = np.ascontiguousarray(values, dtype='<f4')
+    return base64.b64encode(samples.tobytes()).decode('ascii')
+
+
+# Request parameters used by each wavelet type
+_WAVELET_PARAMS = {
+    'Ricker': ('frequency', 'length'),
+    'Ormsby': ('f1', 'f2', 'f3', 'f4', 'length'),
+    'Klauder': ('f1', 'f2', 'length'),
+    'Berlage': ('frequency', 'length'),
+}
+
+
+@lru_cache(maxsize=32)
+def _render(wavelet_type, dt, params, include_plot=True):
+    """Generate wavelet, plot and audio data for a parameter set.
+    
+    The returned dict is shared between cache hits and must not be modified.
+    """
+    params = dict(params)
+    
+    # Generate wavelet based on type
+    if wavelet_type == 'Ricker':
+        wavelet_data, time_data = _GENERATOR.generate_ricker(params['frequency'], params['length'], dt=dt)
+        
+    elif wavelet_type == 'Ormsby':
+        wavelet_data, time_data = _GENERATOR.generate_ormsby(
+            params['f1'], params['f2'], params['f3'], params['f4'], params['length'], dt=dt)
+        
+    elif wavelet_type == 'Klauder':
+        wavelet_data, time_data = _GENERATOR.generate_klauder(params['f1'], params['f2'], params['length'], dt=dt)
+        
+    elif wavelet_type == 'Berlage':
+        wavelet_data, time_data = _GENERATOR.generate_berlage(params['frequency'], params['length'], dt=dt)
+    
+    # Create plot, unless the caller only needs audio
+    plot_base64 = create_plot(time_data, wavelet_data, wavelet_type, dt) if include_plot else None
+    
+    # Prepare audio data (normalized to [-1, 1]) directly into a float32 buffer
+    max_abs = absmax(wavelet_data)
+    audio_data = np.empty(len(wavelet_data), dtype='<f4')
+    np.divide(wavelet_data, max_abs if max_abs > 0 else 1.0, out=audio_data, casting='unsafe')
+    
+    # Calculate sample rate
+    sample_rate = int(round(1.0 / dt))
+    
+    return {
+        'success': True,
+        'plot': plot_base64,
+        'dtype': 'float32',
+        'n': len(wavelet_data),
+        'dt': dt,
+        'audio_b64': _encode_float32(audio_data),
+        'sample_rate': sample_rate,
+        'wavelet_b64': _encode_float32(wavelet_data)
+    }
+
+
 @app.route('/api/generate_wavelet', methods=['POST'])
 def generate_wavelet():
     """Generate wavelet and return plot and audio data."""
@@ -63,78 +208,86 @@ def generate_wavelet():
         data = request.get_json()
         wavelet_type = data.get('wavelet_type')
         dt = data.get('dt', 0.001)
+        include_plot = data.get('include_plot', True)
         
-        generator = WaveletGenerator(dt)
-        
-        # Generate wavelet based on type
-        if wavelet_type == 'Ricker':
-            frequency = data.get('frequency')
-            length = data.get('length')
-            wavelet_data, time_data = generator.generate_ricker(frequency, length)
-            
-        elif wavelet_type == 'Ormsby':
-            f1, f2, f3, f4 = data.get('f1'), data.get('f2'), data.get('f3'), data.get('f4')
-            length = data.get('length')
-            wavelet_data, time_data = generator.generate_ormsby(f1, f2, f3, f4, length)
-            
-        elif wavelet_type == 'Klauder':
-            f1, f2 = data.get('f1'), data.get('f2')
-            length = data.get('length')
-            wavelet_data, time_data = generator.generate_klauder(f1, f2, length)
-            
-        elif wavelet_type == 'Berlage':
-            frequency = data.get('frequency')
-            length = data.get('length')
-            wavelet_data, time_data = generator.generate_berlage(frequency, length)
-        else:
-            return jsonify({'error': 'Invalid wavelet type'}), 400
-        
-        # Create plot
-        plot_base64 = create_plot(time_data, wavelet_data, wavelet_type, dt)
-        
-        # Prepare audio data (normalized to [-1, 1])
-        max_abs = np.max(np.abs(wavelet_data))
-        if max_abs > 0:
-            audio_data = (wavelet_data / max_abs).tolist()
-        else:
-            audio_data = wavelet_data.tolist()
-        
-        # Calculate sample rate
-        sample_rate = int(round(1.0 / dt))
-        
-        return jsonify({
-            'success': True,
-            'plot': plot_base64,
-            'audio_data': audio_data,
-            'sample_rate': sample_rate,
-            'time_data': time_data.tolist(),
-            'wavelet_data': wavelet_data.tolist()
-        })
+        if wavelet_type not in _WAVELET_PARAMS:
+            return _json_response({'error': 'Invalid wavelet type'}), 400
+        if not isinstance(include_plot, bool):
+            return _json_response({'error': 'include_plot must be true or false'}), 400
         
+        params = tuple(sorted((name, data.get(name)) for name in _WAVELET_PARAMS[wavelet_type]))
+        
+        return _json_response(_render(wavelet_type, dt, params, include_plot))
+        
+    except ValueError as e:
+        return _json_response({'error': str(e)}), 400
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return _json_response({'error': str(e)}), 500
 
 
-@app.route('/api/get_frequency_limits', methods=['POST'])
-def get_frequency_limits():
-    """Get frequency limits based on dt value."""
+@app.route('/api/generate_wavelet_grid', methods=['POST'])
+def generate_wavelet_grid():
+    """Generate Ricker wavelets for a list of frequencies.
+    
+    Samples are returned as one base64 float32 blob of shape [len(frequencies), n].
+    """
     try:
         data = request.get_json()
         dt = data.get('dt', 0.001)
+        frequencies = data.get('frequencies')
+        length = data.get('length')
         
-        nyquist_freq = 1.0 / (2.0 * dt)
-        min_freq = 10.0  # Минимум 10 Гц
-        max_freq = nyquist_freq - 10.0  # Найквист - 10 Гц
+        if not frequencies:
+            return _json_response({'error': 'No frequencies given'}), 400
+        if not isinstance(frequencies, list) or not all(
+                isinstance(f, (int, float)) and not isinstance(f, bool) for f in frequencies):
+            return _json_response({'error': 'frequencies must be a flat list of numbers'}), 400
         
-        return jsonify({
-            'min_freq': min_freq,
-            'max_freq': max_freq,
-            'nyquist_freq': nyquist_freq
+        # One contiguous [n_wavelets, n_samples] float32 matrix, sent as a single blob
+        wavelet_data, time_data = _GENERATOR.generate_ricker_batch(
+            frequencies, length, dt=dt, dtype='<f4')
+        
+        return _json_response({
+            'success': True,
+            'dtype': 'float32',
+            'shape': list(wavelet_data.shape),
+            'frequencies': frequencies,
+            'dt': dt,
+            'sample_rate': int(round(1.0 / dt)),
+            'data_b64': _encode_float32(wavelet_data)
         })
         
+    except ValueError as e:
+        return _json_response({'error': str(e)}), 400
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return _json_response({'error': str(e)}), 500
+
+
+@app.route('/api/get_frequency_limits', methods=['POST'])
+def get_frequency_limits():
+    """Get frequency limits based on dt value."""
+    # Pure arithmetic: no try/except needed, check the one bad input explicitly
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        return _json_response({'error': 'Request body must be a JSON object'}), 400
+    dt = data.get('dt', 0.001)
+    if isinstance(dt, bool) or not isinstance(dt, (int, float)) or not dt > 0:
+        return _json_response({'error': 'dt must be a positive number'}), 400
+    
+    nyquist_freq = 1.0 / (2.0 * dt)
+    min_freq = 10.0  # Минимум 10 Гц
+    max_freq = nyquist_freq - 10.0  # Найквист - 10 Гц
+    
+    return _json_response({
+        'min_freq': min_freq,
+        'max_freq': max_freq,
+        'nyquist_freq': nyquist_freq
+    })
 
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Serve with a multi-threaded WSGI server; the shared figure is guarded by _PLOT_LOCK
+    from waitress import serve
+    serve(app, host='0.0.0.0', port=5000, threads=4)
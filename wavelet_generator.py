@@ -4,32 +4,223 @@ Wavelet Generator module for Seismic Wavelet Sonifier.
 Supports Ricker, Ormsby, Klauder, and Berlage wavelets.
 """
 
+import math
+import threading
+from functools import lru_cache
+
 import numpy as np
-import bruges as bg
+import numba
+from numba import njit, prange
+
+
+# Upper bound on samples per wavelet (5 s at dt=0.0001). Results are memoized,
+# so unbounded lengths would let a client pin arbitrary amounts of memory.
+MAX_SAMPLES = 50_000
+# Upper bound on frequencies x samples for one batch; batches are not cached
+MAX_BATCH_SAMPLES = 1_000_000
+
+
+def _round(value):
+    """Round a numeric parameter so equivalent inputs share a cache entry."""
+    return round(float(value), 6)
+
+
+def _freeze(w, t):
+    """Mark cached arrays read-only so callers cannot corrupt the cache."""
+    w = np.asarray(w)
+    t = np.asarray(t)
+    w.setflags(write=False)
+    t.setflags(write=False)
+    return w, t
+
+
+def _num_samples(dt, length):
+    """Number of samples in the time axis; raises ValueError above MAX_SAMPLES."""
+    if dt <= 0 or length <= 0:
+        raise ValueError('dt and length must be positive')
+    n = int(length / dt)
+    if n % 2 == 0:
+        n += 1
+    if n > MAX_SAMPLES:
+        raise ValueError(f'Wavelet would have {n} samples; the maximum is {MAX_SAMPLES}')
+    return n
+
+
+def _time_axis(dt, length):
+    """Symmetric time axis with an odd number of samples, centred on zero (as in bruges)."""
+    n = _num_samples(dt, length)
+    t = (np.arange(n) - n // 2) * dt
+    return n, t
+
+
+@njit(cache=True)
+def absmax(x):
+    """Largest absolute value of a 1D array in a single pass, without a temporary."""
+    m = 0.0
+    for v in x:
+        a = abs(v)
+        if a > m:
+            m = a
+    return m
+
+
+@njit(fastmath=True, cache=True)
+def _ricker_kernel(n, dt, f, out):
+    c = math.pi * f
+    half = n // 2
+    for i in range(n):
+        x = c * (i - half) * dt
+        x2 = x * x
+        out[i] = (1.0 - 2.0 * x2) * math.exp(-x2)
+
+
+# Pin the workqueue threading layer: with TBB installed Numba would pick it by
+# default, and a TBB kernel launched from a worker thread hangs interpreter exit.
+# workqueue aborts the process if two threads launch a parallel kernel at once,
+# so calls to _ricker_batch_kernel are serialized.
+numba.config.THREADING_LAYER = 'workqueue'
+_BATCH_LOCK = threading.Lock()
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def _ricker_batch_kernel(freqs, n, dt, out):
+    half = n // 2
+    for k in prange(freqs.size):
+        c = math.pi * freqs[k]
+        for i in range(n):
+            x = c * (i - half) * dt
+            x2 = x * x
+            out[k, i] = (1.0 - 2.0 * x2) * math.exp(-x2)
+
+
+@njit(fastmath=True, cache=True)
+def _sinc2_term(f, t):
+    """sinc(f t)**2 * (pi f)**2, the numerator of the Ormsby equation."""
+    x = math.pi * f * t
+    if x == 0.0:
+        return (math.pi * f) ** 2
+    s = math.sin(x) / x
+    return s * s * (math.pi * f) ** 2
+
+
+@njit(fastmath=True, cache=True)
+def _ormsby_kernel(n, dt, f1, f2, f3, f4, out):
+    pf43 = math.pi * f4 - math.pi * f3
+    pf21 = math.pi * f2 - math.pi * f1
+    half = n // 2
+    peak = 0.0
+    for i in range(n):
+        t = (i - half) * dt
+        w = ((_sinc2_term(f4, t) - _sinc2_term(f3, t)) / pf43 -
+             (_sinc2_term(f2, t) - _sinc2_term(f1, t)) / pf21)
+        out[i] = w
+        if w > peak:
+            peak = w
+    # Normalize only a non-zero peak; the caller rejects a zero one
+    if peak != 0.0:
+        for i in range(n):
+            out[i] /= peak
+    return peak
+
+
+@njit(fastmath=True, cache=True)
+def _berlage_kernel(n, dt, f, power, alpha, phi, out):
+    half = n // 2
+    peak = 0.0
+    for i in range(n):
+        t = (i - half) * dt
+        if t > 0.0:
+            w = t ** power * math.exp(-alpha * t) * math.cos(2.0 * math.pi * f * t + phi)
+        else:
+            w = 0.0
+        out[i] = w
+        if abs(w) > peak:
+            peak = abs(w)
+    if peak != 0.0:
+        for i in range(n):
+            out[i] /= peak
+    return peak
+
+
+@lru_cache(maxsize=32)
+def _ricker(dt, frequency, length):
+    n, t = _time_axis(dt, length)
+    w = np.empty(n)
+    _ricker_kernel(n, dt, frequency, w)
+    return _freeze(w, t)
+
+
+@lru_cache(maxsize=32)
+def _ormsby(dt, f1, f2, f3, f4, length):
+    if not (f1 < f2 and f3 < f4):
+        raise ValueError('Ormsby frequencies must satisfy f1 < f2 and f3 < f4')
+    n, t = _time_axis(dt, length)
+    w = np.empty(n)
+    if _ormsby_kernel(n, dt, f1, f2, f3, f4, w) == 0.0:
+        raise ValueError('Ormsby wavelet has zero amplitude for these parameters')
+    return _freeze(w, t)
+
+
+@lru_cache(maxsize=32)
+def _klauder(dt, f1, f2, length):
+    _num_samples(dt, length)
+    # bruges is only needed here; import it on first use to keep startup fast
+    import bruges as bg
+    w, t = bg.filters.klauder(duration=length, dt=dt, f=[f1, f2], return_t=True)
+    return _freeze(w, t)
+
+
+@lru_cache(maxsize=32)
+def _berlage(dt, frequency, length):
+    # Same shape parameters as the bruges defaults
+    n, t = _time_axis(dt, length)
+    w = np.empty(n)
+    if _berlage_kernel(n, dt, frequency, 2.0, 180.0, -math.pi / 2, w) == 0.0:
+        raise ValueError('Berlage wavelet has zero amplitude; increase length')
+    return _freeze(w, t)
 
 
 class WaveletGenerator:
-    """Class to generate different types of seismic wavelets."""
-    
+    """Class to generate different types of seismic wavelets.
+
+    Results are memoized by parameters and returned as read-only arrays;
+    copy them before modifying in place. Every method accepts an explicit
+    ``dt`` that overrides ``self.dt``, so one instance can be shared by
+    concurrent callers with different sample intervals.
+    """
+
     def __init__(self, dt=0.001):
         self.dt = dt
-        
-    def generate_ricker(self, frequency, length):
+
+    def _dt(self, dt):
+        return float(self.dt if dt is None else dt)
+
+    def generate_ricker(self, frequency, length, dt=None):
         """Generate Ricker wavelet."""
-        w, t = bg.filters.ricker(duration=length, dt=self.dt, f=frequency, return_t=True)
+        return _ricker(self._dt(dt), _round(frequency), _round(length))
+
+    def generate_ricker_batch(self, frequencies, length, dt=None, dtype=np.float64):
+        """Generate one Ricker wavelet per frequency as rows of a contiguous 2D array."""
+        dt = self._dt(dt)
+        freqs = np.asarray(frequencies, dtype=np.float64)
+        if freqs.ndim != 1:
+            raise ValueError('frequencies must be a flat list of numbers')
+        n, t = _time_axis(dt, _round(length))
+        if freqs.size * n > MAX_BATCH_SAMPLES:
+            raise ValueError(f'Grid would have {freqs.size * n} samples; the maximum is {MAX_BATCH_SAMPLES}')
+        w = np.empty((freqs.size, n), dtype=dtype)
+        with _BATCH_LOCK:
+            _ricker_batch_kernel(freqs, n, dt, w)
         return w, t
-    
-    def generate_ormsby(self, f1, f2, f3, f4, length):
+
+    def generate_ormsby(self, f1, f2, f3, f4, length, dt=None):
         """Generate Ormsby wavelet."""
-        w, t = bg.filters.ormsby(duration=length, dt=self.dt, f=[f1, f2, f3, f4], return_t=True)
-        return w, t
-    
-    def generate_klauder(self, f1, f2, length):
+        return _ormsby(self._dt(dt), _round(f1), _round(f2), _round(f3), _round(f4), _round(length))
+
+    def generate_klauder(self, f1, f2, length, dt=None):
         """Generate Klauder wavelet."""
-        w, t = bg.filters.klauder(duration=length, dt=self.dt, f=[f1, f2], return_t=True)
-        return w, t
-    
-    def generate_berlage(self, frequency, length):
+        return _klauder(self._dt(dt), _round(f1), _round(f2), _round(length))
+
+    def generate_berlage(self, frequency, length, dt=None):
         """Generate Berlage wavelet."""
-        w, t = bg.filters.berlage(duration=length, dt=self.dt, f=frequency, return_t=True)
-        return w, t
+        return _berlage(self._dt(dt), _round(frequency), _round(length))